@@ -4,13 +4,28 @@ XEX Constructor Table Finder
 Analyzes Xbox 360 XEX files to locate C++ constructor tables (.ctors section)
 """
 
+import argparse
+import contextlib
+import io
+import mmap
+import re
 import struct
 import sys
+from multiprocessing import Pool
 from pathlib import Path
 
 # XEX2 Header structure
 XEX2_MAGIC = b'XEX2'
 
+U32_BE = struct.Struct('>I')
+U16_BE = struct.Struct('>H')
+OPTIONAL_HEADER_ENTRY = struct.Struct('>II')
+
+# Optional header storage, keyed by the low byte of the header ID:
+# 0xFF = offset to a data block, 0x00 = no additional data, 0x01 = 4 bytes inline.
+# Any other value is the size of a data block at an offset, in dwords.
+OPTIONAL_HEADER_TYPES = {0xFF: 'offset', 0x00: 'none', 0x01: 'inline'}
+
 # Optional header IDs we care about
 XEX_HEADER_ENTRY_POINT = 0x00010100
 XEX_HEADER_BASE_ADDRESS = 0x00010201
@@ -20,13 +35,37 @@ XEX_HEADER_TLS_INFO = 0x00020104
 XEX_HEADER_DEFAULT_STACK_SIZE = 0x00020200
 XEX_HEADER_PE_MODULE_NAME = 0x000183FF
 
+# Guest code lives at 0x82000000-0x82FFFFFF, so a word looks like a code
+# pointer when (val & CODE_ADDRESS_MASK) == CODE_ADDRESS_TAG
+CODE_ADDRESS_MASK = 0xFF000000
+CODE_ADDRESS_TAG = 0x82000000
+
+# Maps non-printable bytes to '.' when showing data words as text
+PRINTABLE_ASCII = bytes(c if 32 <= c < 127 else ord('.') for c in range(256))
+
+# Maps a word's high byte to 1 if it matches CODE_ADDRESS_TAG, else 0
+CODE_TAG_LANE = bytes(int(c == CODE_ADDRESS_TAG >> 24) for c in range(256))
+
+# A 4-word window is a table candidate when at least 3 of its words are tagged
+CANDIDATE_SCORE_RE = re.compile(rb'[\x03\x04]')
+
+# A pointer table is a run of CODE_ADDRESS_TAG words, optionally closed by a
+# 0 or 0xFFFFFFFF terminator word. Matched at a word-aligned offset, so every
+# repetition consumes exactly one big-endian word.
+POINTER_RUN_RE = re.compile(rb'(?:\x82...)*(?:\x00{4}|\xff{4})?', re.DOTALL)
+
 def read_u32_be(data, offset):
     """Read big-endian 32-bit unsigned int"""
-    return struct.unpack('>I', data[offset:offset+4])[0]
+    return U32_BE.unpack_from(data, offset)[0]
+
+def read_u32_be_array(data, offset, count):
+    """Read count consecutive big-endian 32-bit unsigned ints"""
+    # One unpack for the whole block instead of a struct call per word
+    return list(struct.unpack_from(f'>{count}I', data, offset))
 
 def read_u16_be(data, offset):
     """Read big-endian 16-bit unsigned int"""
-    return struct.unpack('>H', data[offset:offset+2])[0]
+    return U16_BE.unpack_from(data, offset)[0]
 
 def parse_xex_header(data):
     """Parse XEX2 header and optional headers"""
@@ -49,35 +88,73 @@ def parse_xex_header(data):
     
     # Parse optional headers (start at offset 0x18)
     headers = {}
-    offset = 0x18
+    table_size = OPTIONAL_HEADER_ENTRY.size * optional_header_count
+    table = data[0x18:0x18 + table_size]
+    if len(table) != table_size:
+        raise ValueError("Truncated XEX2 optional header table")
     
-    for i in range(optional_header_count):
-        header_id = read_u32_be(data, offset)
-        header_data = read_u32_be(data, offset + 4)
-        
-        # Check if it's inline data or an offset
-        # If lower byte of header_id is 0xFF, it's an offset to more data
-        # If lower byte is 0x00-0x01, it's inline data
+    for header_id, header_data in OPTIONAL_HEADER_ENTRY.iter_unpack(table):
         key_size = header_id & 0xFF
         key_id = header_id & 0xFFFFFF00
+        header_type = OPTIONAL_HEADER_TYPES.get(key_size, 'sized')
         
-        if key_size == 0xFF:
-            # Offset to data block
-            headers[key_id] = {'type': 'offset', 'offset': header_data, 'raw_id': header_id}
-        elif key_size == 0x00:
-            # No additional data
-            headers[key_id] = {'type': 'none', 'value': header_data, 'raw_id': header_id}
-        elif key_size == 0x01:
-            # 4 bytes inline
-            headers[key_id] = {'type': 'inline', 'value': header_data, 'raw_id': header_id}
+        if header_type == 'offset':
+            headers[key_id] = {'type': header_type, 'offset': header_data, 'raw_id': header_id}
+        elif header_type == 'sized':
+            headers[key_id] = {'type': header_type, 'size': key_size * 4, 'offset': header_data, 'raw_id': header_id}
         else:
-            # key_size * 4 bytes of data at offset
-            headers[key_id] = {'type': 'sized', 'size': key_size * 4, 'offset': header_data, 'raw_id': header_id}
-        
-        offset += 8
+            headers[key_id] = {'type': header_type, 'value': header_data, 'raw_id': header_id}
     
     return headers, pe_data_offset, security_info_offset
 
+def scan_pointer_tables(data, pe_offset):
+    """Find runs of function pointers in the first 1 MB of PE data"""
+    # Search through the file for sequences of big-endian addresses
+    # that look like 0x82XXXXXX (valid code addresses)
+    potential_tables = []
+    
+    # Scan in 4-byte chunks. Every 4th byte starting at pe_offset is the high
+    # byte of a big-endian word, so all windows are scored at once: with one
+    # byte lane per word, adding the lane vector to itself shifted by 1-3 lanes
+    # leaves the tagged-word count of window i in lane i. Counts are at most
+    # 4, so lanes never carry into each other.
+    scan_end = min(len(data) - 16, pe_offset + 0x100000)
+    high_bytes = data[pe_offset:scan_end + 12:4]
+    lanes = len(high_bytes)
+    tagged = int.from_bytes(high_bytes.translate(CODE_TAG_LANE), 'big')
+    window_sums = (tagged + (tagged << 8) + (tagged << 16) + (tagged << 24)) & ((1 << (8 * lanes)) - 1)
+    scores = window_sums.to_bytes(lanes, 'big')
+    
+    # Length walks stop at 8000 bytes or at the last word that starts before
+    # len(data) - 4. Candidates share pe_offset's alignment, so that word
+    # boundary is the same for all of them.
+    walk_cap = pe_offset + (len(data) - 4 - pe_offset + 3) // 4 * 4
+    last_table_offset = -32
+    
+    for match in CANDIDATE_SCORE_RE.finditer(scores, 0, max(lanes - 3, 0)):
+        scan_offset = pe_offset + match.start() * 4
+        
+        # Check if we haven't already recorded this area. Candidates come in
+        # ascending order, so only the last recorded table can be within range.
+        if scan_offset - last_table_offset >= 32:
+            # Count how many consecutive valid pointers, up to and including
+            # the terminator
+            run = POINTER_RUN_RE.match(data, scan_offset, min(walk_cap, scan_offset + 8000))
+            count = (run.end() - scan_offset) // 4
+            
+            if count >= 4:
+                # Keep the leading values for the detailed analysis
+                values = read_u32_be_array(data, scan_offset, min(count, 20))
+                potential_tables.append({
+                    'offset': scan_offset,
+                    'count': count,
+                    'first_values': values[:4],
+                    'values': values
+                })
+                last_table_offset = scan_offset
+    
+    return potential_tables
+
 def find_ctors_in_pe(data, pe_offset, base_address):
     """Search for constructor tables in the PE data"""
     print(f"\n=== Searching for Constructor Tables ===")
@@ -103,58 +180,17 @@ def find_ctors_in_pe(data, pe_offset, base_address):
     
     print(f"\n=== Scanning for function pointer arrays ===")
     
-    # Search through the file for sequences of big-endian addresses
-    # that look like 0x82XXXXXX (valid code addresses)
-    
-    potential_tables = []
-    
-    # Scan in 4-byte chunks
-    for scan_offset in range(pe_offset, min(len(data) - 16, pe_offset + 0x100000), 4):
-        # Read 4 consecutive potential pointers
-        vals = []
-        valid_count = 0
-        for j in range(4):
-            val = read_u32_be(data, scan_offset + j*4)
-            vals.append(val)
-            # Check if it looks like a code address
-            if 0x82000000 <= val <= 0x82FFFFFF:
-                valid_count += 1
-        
-        # If we found 4 consecutive valid-looking pointers, this might be a table
-        if valid_count >= 3:
-            # Check if we haven't already recorded this area
-            already_found = False
-            for pt in potential_tables:
-                if abs(pt['offset'] - scan_offset) < 32:
-                    already_found = True
-                    break
-            
-            if not already_found:
-                # Count how many consecutive valid pointers
-                count = 0
-                for check_off in range(scan_offset, min(len(data) - 4, scan_offset + 8000), 4):
-                    val = read_u32_be(data, check_off)
-                    if 0x82000000 <= val <= 0x82FFFFFF or val == 0 or val == 0xFFFFFFFF:
-                        count += 1
-                        if val == 0 or val == 0xFFFFFFFF:
-                            break
-                    else:
-                        break
-                
-                if count >= 4:
-                    potential_tables.append({
-                        'offset': scan_offset,
-                        'count': count,
-                        'first_values': vals
-                    })
+    potential_tables = scan_pointer_tables(data, pe_offset)
     
-    print(f"Found {len(potential_tables)} potential function pointer tables:")
+    lines = [f"Found {len(potential_tables)} potential function pointer tables:"]
     for i, pt in enumerate(potential_tables[:20]):  # Show first 20
-        print(f"  [{i}] Offset 0x{pt['offset']:08X}, ~{pt['count']} entries")
-        print(f"      First values: {' '.join(f'0x{v:08X}' for v in pt['first_values'])}")
+        lines.append(f"  [{i}] Offset 0x{pt['offset']:08X}, ~{pt['count']} entries")
+        lines.append(f"      First values: {' '.join(f'0x{v:08X}' for v in pt['first_values'])}")
     
     if len(potential_tables) > 20:
-        print(f"  ... and {len(potential_tables) - 20} more")
+        lines.append(f"  ... and {len(potential_tables) - 20} more")
+    
+    sys.stdout.write("\n".join(lines) + "\n")
     
     return potential_tables
 
@@ -184,73 +220,126 @@ def search_for_specific_addresses(data):
         if pos != -1:
             print(f"Found 0x{target:08X} (LE) at file offset 0x{pos:08X}")
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: xex_ctor_finder.py <path_to_xex>")
-        sys.exit(1)
-    
-    xex_path = Path(sys.argv[1])
-    if not xex_path.exists():
-        print(f"Error: File not found: {xex_path}")
-        sys.exit(1)
-    
+def analyze(xex_path):
+    """Run the full analysis on one XEX and return the key results"""
     print(f"Analyzing: {xex_path}")
     print(f"File size: {xex_path.stat().st_size} bytes")
     print()
     
+    # Map the file instead of reading it so only the pages the header parse,
+    # address search and scan actually touch get loaded.
     with open(xex_path, 'rb') as f:
-        data = f.read()
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    try:
+        # Parse headers
+        headers, pe_offset, security_offset = parse_xex_header(data)
+        
+        # Extract key info
+        entry_point = None
+        base_address = 0x82000000  # Default
+        
+        print("=== Optional Headers ===")
+        for key_id, info in headers.items():
+            if key_id == XEX_HEADER_ENTRY_POINT:
+                entry_point = info.get('value')
+                print(f"Entry Point: 0x{entry_point:08X}")
+            elif key_id == XEX_HEADER_BASE_ADDRESS:
+                base_address = info.get('value', 0x82000000)
+                print(f"Base Address: 0x{base_address:08X}")
+            elif key_id == XEX_HEADER_TLS_INFO:
+                print(f"TLS Info: offset=0x{info.get('offset', 0):08X}")
+        
+        # Search for specific addresses
+        search_for_specific_addresses(data)
+        
+        # Look for constructor tables
+        tables = find_ctors_in_pe(data, pe_offset, base_address)
+        
+        # Detailed analysis of most promising tables
+        if tables:
+            lines = ["", "=== Detailed Analysis of Top Candidates ==="]
+            for i, pt in enumerate(tables[:5]):
+                lines.append(f"\nTable {i} at file offset 0x{pt['offset']:08X}:")
+                lines.append(f"  Values: ")
+                for j, v in enumerate(pt['values']):
+                    if v == 0:
+                        lines.append(f"    [{j}] 0x{v:08X} (NULL)")
+                    elif v == 0xFFFFFFFF:
+                        lines.append(f"    [{j}] 0x{v:08X} (-1/terminator)")
+                    elif (v & CODE_ADDRESS_MASK) == CODE_ADDRESS_TAG:
+                        lines.append(f"    [{j}] 0x{v:08X} (code ptr)")
+                    else:
+                        # Show as ASCII
+                        ascii_val = v.to_bytes(4, 'big').translate(PRINTABLE_ASCII).decode('ascii')
+                        lines.append(f"    [{j}] 0x{v:08X} (data: '{ascii_val}')")
+            
+            sys.stdout.write("\n".join(lines) + "\n")
+    finally:
+        data.close()
     
-    # Parse headers
-    headers, pe_offset, security_offset = parse_xex_header(data)
+    return {
+        'path': str(xex_path),
+        'entry_point': entry_point,
+        'base_address': base_address,
+        'tables': tables
+    }
+
+def analyze_captured(xex_path):
+    """Batch worker: run analyze() and return its results with the printed report"""
+    report = io.StringIO()
+    with contextlib.redirect_stdout(report):
+        try:
+            result = analyze(xex_path)
+        except (OSError, ValueError, struct.error) as e:
+            result = {'path': str(xex_path), 'error': str(e)}
+    result['report'] = report.getvalue()
+    return result
+
+def print_summary(result):
+    """Print the one-line batch summary for an analyzed XEX"""
+    if 'error' in result:
+        print(f"{result['path']}: error: {result['error']}")
+        return
     
-    # Extract key info
-    entry_point = None
-    base_address = 0x82000000  # Default
+    entry_point = result['entry_point']
+    entry = f"0x{entry_point:08X}" if entry_point is not None else "unknown"
+    print(f"{result['path']}: entry point {entry}, {len(result['tables'])} potential tables")
+
+def main():
+    ap = argparse.ArgumentParser(description="Locate C++ constructor tables in Xbox 360 XEX files.")
+    ap.add_argument("xex", nargs="+", type=Path, help="Path to .xex file (several with --batch)")
+    ap.add_argument("--batch", action="store_true", help="Analyze all given files in parallel")
+    ap.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes for --batch (default: CPU count)")
+    args = ap.parse_args()
+    
+    if len(args.xex) > 1 and not args.batch:
+        ap.error("multiple files require --batch")
+    if args.jobs is not None and args.jobs < 1:
+        ap.error("--jobs must be at least 1")
     
-    print("=== Optional Headers ===")
-    for key_id, info in headers.items():
-        if key_id == XEX_HEADER_ENTRY_POINT:
-            entry_point = info.get('value')
-            print(f"Entry Point: 0x{entry_point:08X}")
-        elif key_id == XEX_HEADER_BASE_ADDRESS:
-            base_address = info.get('value', 0x82000000)
-            print(f"Base Address: 0x{base_address:08X}")
-        elif key_id == XEX_HEADER_TLS_INFO:
-            print(f"TLS Info: offset=0x{info.get('offset', 0):08X}")
+    missing = [p for p in args.xex if not p.exists()]
+    for xex_path in missing:
+        print(f"Error: File not found: {xex_path}")
+    if missing:
+        sys.exit(1)
     
-    # Search for specific addresses
-    search_for_specific_addresses(data)
+    if not args.batch:
+        analyze(args.xex[0])
+        return
     
-    # Look for constructor tables
-    tables = find_ctors_in_pe(data, pe_offset, base_address)
+    # Files are independent, so each worker maps and scans its own file and
+    # the reports are written out as they complete
+    results = []
+    with Pool(processes=args.jobs) as pool:
+        for result in pool.imap_unordered(analyze_captured, args.xex):
+            sys.stdout.write(result['report'])
+            print()
+            results.append(result)
     
-    # Detailed analysis of most promising tables
-    if tables:
-        print(f"\n=== Detailed Analysis of Top Candidates ===")
-        for i, pt in enumerate(tables[:5]):
-            print(f"\nTable {i} at file offset 0x{pt['offset']:08X}:")
-            # Read more values
-            values = []
-            for j in range(min(pt['count'], 20)):
-                val = read_u32_be(data, pt['offset'] + j*4)
-                values.append(val)
-            
-            print(f"  Values: ")
-            for j, v in enumerate(values):
-                if v == 0:
-                    print(f"    [{j}] 0x{v:08X} (NULL)")
-                elif v == 0xFFFFFFFF:
-                    print(f"    [{j}] 0x{v:08X} (-1/terminator)")
-                elif 0x82000000 <= v <= 0x82FFFFFF:
-                    print(f"    [{j}] 0x{v:08X} (code ptr)")
-                else:
-                    # Try to interpret as ASCII
-                    try:
-                        ascii_val = struct.pack('>I', v).decode('ascii', errors='replace')
-                        print(f"    [{j}] 0x{v:08X} (data: '{ascii_val}')")
-                    except:
-                        print(f"    [{j}] 0x{v:08X} (unknown)")
+    print("=== Batch Summary ===")
+    for result in sorted(results, key=lambda r: r['path']):
+        print_summary(result)
 
 if __name__ == '__main__':
     main()